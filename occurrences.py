@@ -8,12 +8,93 @@
 
 #Standard Imports
 import argparse
-import csv
+import mmap
 import os
 import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from operator import add, itemgetter
+from pathlib import Path
+
+#Look for ASCII words starting with alphabetic char followed by 2-60 alphanumeric chars
+wordfinder = re.compile(rb'\b[A-Za-z][A-Za-z0-9_\-\.]{2,60}\b', re.ASCII)
+findwords = wordfinder.findall
+
+#Look for ASCII words, or whole runs of word chars, dots and hyphens containing non-ASCII chars
+mixedfinder = re.compile(rb'\b[A-Za-z][A-Za-z0-9_\-\.]{2,60}\b(?![A-Za-z0-9_\-\.]*[\x80-\xff])|[A-Za-z0-9_\-\.]*[\x80-\xff][A-Za-z0-9_\-\.\x80-\xff]*', re.ASCII)
+nonasciifinder = re.compile(rb'[\x80-\xff]')
+
+#Unicode aware wordfinder, used on decoded runs which contain non-ASCII chars
+unicodefinder = re.compile(r'\b[A-Za-z][\w\-\.]{2,60}\b')
+
+#Minimum total size of files before counting them in separate processes
+poolminsize = 8 * 1024 * 1024
+
+def count_words(textdata: bytes, ignorewords: set) -> Counter:
+    """
+    Count the number of times a word appears in a string
+    Disregard any words that appear in ignorewords set
+
+    Returns:
+        Counter of words (as bytes) with occurrences of each word
+    """
+    if type(textdata) == str:
+        textdata = textdata.encode('utf-8')
+
+    #Use findall regex to find all alphanumeric words in textdata and count them
+    if nonasciifinder.search(textdata) is None:
+        worddict = Counter(findwords(textdata))
+    else:
+        worddict = count_mixed_words(textdata)
+
+    #Remove any words that appear in the ignorewords set
+    if ignorewords:
+        for word in worddict.keys() & ignorewords:
+            del worddict[word]
+
+    return worddict
+
+
+def count_mixed_words(textdata: bytes) -> Counter:
+    """
+    Count the number of times a word appears in a string containing non-ASCII chars
+    Runs containing non-ASCII chars are decoded and matched with unicodefinder
+    Words with non-ASCII letters or digits (e.g. café) are left out
+
+    Returns:
+        Counter of words (as bytes) with occurrences of each word
+    """
+    worddict = Counter()
+
+    #Count each distinct run once, keeping words in order of first occurrence
+    for token, count in Counter(mixedfinder.findall(textdata)).items():
+        if token.isascii():
+            worddict[token] += count
+            continue
+        for word in unicodefinder.findall(token.decode('utf-8', 'replace')):
+            if word.isascii():
+                worddict[word.encode('ascii')] += count
+
+    return worddict
+
+
+def count_file(filename: Path, ignorewords: set) -> Counter:
+    """
+    Load a file with load_file and count the words in it
+    Module level function so that ProcessPoolExecutor workers can map the file themselves
+
+    Returns:
+        Counter of words (as bytes) with occurrences of each word
+    """
+    textdata = load_file(filename)
+    worddict = count_words(textdata, ignorewords)
+
+    if isinstance(textdata, mmap.mmap):
+        textdata.close()
+
+    return worddict
 
-#Look for words starting with alphabetic char followed by 2-60 alphanumeric chars
-wordfinder = re.compile(r'\b([A-Za-z][\w\-\.]{2,60})\b')
 
 class DocumentAnalyser:
     """
@@ -24,7 +105,7 @@ class DocumentAnalyser:
 
     Parse the documents to be checked when initialising the class
 
-    find_duplicates will provide a dictionary or words and count of occurrences
+    find_duplicates will provide a sorted list of words and count of occurrences
     display_results calls find_duplicates and displays the results on screen
     save_results calls find_duplicates and saves the results to results.csv
     """
@@ -33,7 +114,7 @@ class DocumentAnalyser:
         Processes parsed values and counts occurrences of words in the documents supplied
 
         Parameters:
-            checkdocuments: string of text to check or list text strings to check
+            checkdocuments: string of text or Path of file to check, or list of them to check
         Optional Parameters
             ignoredocuments: string of text to check or list text strings to ignore
             mincount: Minimum count for duplicate words (default 1)
@@ -42,8 +123,8 @@ class DocumentAnalyser:
         """
         self._mincount = 1
         self._maxcount = 256
-        self._documents = list()
-        self._ignorewords = set()
+        self._documents = list()                           #Counters of words (as bytes)
+        self._ignorewords = set()                          #Set of words (as bytes)
 
         ignoredocuments = kwargs.get('ignoredocuments', None)
         self._mincount = kwargs.get('mincount', self._mincount)
@@ -53,102 +134,105 @@ class DocumentAnalyser:
         self.__process_check(checkdocuments)
 
 
-    def __add_ignore(self, textdata: str) -> None:
+    def __add_ignore(self, textdata: bytes) -> None:
         """
         Add words from a string to _ignorewords set
         Not bothered about count or duplicates (since sets will ignore duplicates)
         """
-        #Use finditer regex to find all alphanumeric words in textdata
-        words = wordfinder.finditer(textdata)
+        if type(textdata) == str:
+            textdata = textdata.encode('utf-8')
 
-        for word in words:
-            self._ignorewords.add(word.group(0))           #Add word to _ignorewords set
+        #Use count_words to find all alphanumeric words in textdata
+        self._ignorewords.update(count_words(textdata, set()))
 
 
-    def __count_occurrences(self, textdata: str) -> None:
+    def __count_occurrences(self, textdata: bytes or Path) -> None:
         """
-        Count the number of times a word appears in a string
+        Count the number of times a word appears in a string, or in a file if given a Path
+        Words are kept as bytes, they are only decoded when displaying or saving results
         Disregard any words that appear in the _ignore set
         Add resultant dictionary of words to _documents list
         """
-        worddict = dict()                                  #Dictionary of words found
-
-        #Use finditer regex to find all alphanumeric words in textdata
-        words = wordfinder.finditer(textdata)
-
-        for word in words:
-            #Is word in _ignorewords set?
-            if word.group(0) in self._ignorewords:
-                continue
-            #Check if the word is already in worddict
-            if word.group(0) in worddict:
-                worddict[word.group(0)] += 1
-            #Or add it to worddict
-            else:
-                worddict[word.group(0)] = 1
-
-        #Add the current worddict to _documents list
-        self._documents.append(worddict)
+        if isinstance(textdata, Path):
+            self._documents.append(count_file(textdata, self._ignorewords))
+        else:
+            self._documents.append(count_words(textdata, self._ignorewords))
 
 
     def __process_check(self, checkdocuments: str or list) -> None:
         """
         Process documents to check
         Parameters:
-            checkdocuments can be either a single text string or list of strings
+            checkdocuments can be either a single text string (str, bytes, mmap or Path of file) or list of them
         """
         if checkdocuments is None:
             return
         #Single text string to count
-        if type(checkdocuments) == str:
+        if isinstance(checkdocuments, (str, bytes, mmap.mmap, Path)):
             self.__count_occurrences(checkdocuments)
-        #Multiple text strings to count
+            return
+
+        documents = list(checkdocuments)
+        workers = min(len(documents), os.cpu_count() or 1)
+
+        #Only large sets of files are counted in separate processes
+        if workers > 1 and all(isinstance(document, Path) for document in documents):
+            totalsize = sum(document.stat().st_size for document in documents if document.is_file())
         else:
-            for document in checkdocuments:
+            totalsize = 0
+
+        #Multiple text strings to count
+        if totalsize < poolminsize:
+            for document in documents:
                 self.__count_occurrences(document)
+            return
+
+        #Count each file in a separate process
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            self._documents.extend(executor.map(count_file, documents, repeat(self._ignorewords)))
 
 
     def __process_ignore(self, ignoredocuments: str or list):
         """
         Process documents to ignore
         Parameters:
-            ignoredocuments can be either a single text string or list of strings
+            ignoredocuments can be either a single text string (str, bytes or mmap) or list of strings
         """
-        if ignoredocuments is None:
+        #Nothing to ignore
+        if not ignoredocuments:
             return
         #Single text string of words to ignore
-        if type(ignoredocuments) == str:
+        if isinstance(ignoredocuments, (str, bytes, mmap.mmap)):
             self.__add_ignore(ignoredocuments)
         #Multiple text strings of words to ignore
         else:
-            for document in checkdocuments:
-                self.__count_occurrences(document)
+            for document in ignoredocuments:
+                self.__add_ignore(document)
 
 
     def display_results(self) -> None:
         """
         Find duplicate words then print resultant count to screen
         """
-        worddict = self.find_duplicates()
+        wordlist = self.find_duplicates()
 
-        if worddict is None:
+        if wordlist is None:
             print('No results found')
             return
 
-        for key, value in worddict.items():
-            print(f'{key:<32} {value}')
+        for key, value in wordlist:
+            print(f'{key.decode("utf-8", "replace"):<32} {value}')
 
 
-    def find_duplicates(self) -> dict:
+    def find_duplicates(self) -> list:
         """
         Count number of duplicate words from dictionaries that appear in all the _documents list
 
         Returns:
-            sorted dictionary of words with occurrences of each word
+            list of (word, occurrences) tuples sorted by occurrences
         """
-        results = dict()
+        results = list()
         documentslen = 0
-        foundin = 0                #Count number of documents a word has been found in
 
         documentslen = len(self._documents)
 
@@ -156,36 +240,34 @@ class DocumentAnalyser:
             return None
 
         if documentslen == 1:
-            results = self._documents[0]
-            #Sort by number of occurrences from lowest to highest
-            results = dict(sorted(results.items(), key=lambda x:x[1]))
             #Limit results to between min and max count
-            results = {key: value for key, value in filter(lambda x: x[1] >= self._mincount and x[1] <= self._maxcount, results.items())}
+            mincount, maxcount = self._mincount, self._maxcount
+            results = [(key, value) for key, value in self._documents[0].items() if mincount <= value <= maxcount]
+            #Sort by number of occurrences from lowest to highest
+            results.sort(key=itemgetter(1))
             return results
 
 
-        #Review all words in dict zero
-        for word, firstcount in self._documents[0].items():
-            foundin = 1
-            wordcount = 0
-            #Check all dict's from one to n
-            for i in range (1, documentslen):
-                if word in self._documents[i]:
-                    foundin += 1
-                    wordcount += self._documents[i][word]
-
-            #Has word not been found in all dict's?
-            if foundin < documentslen:
-                continue
+        #Find words common to all dict's, starting with the smallest
+        documents = sorted(self._documents, key=len)
+        common = documents[0].keys()
+        for document in documents[1:]:
+            common = common & document.keys()
+            if not common:
+                return results
 
-            wordcount += firstcount                        #Include the count from dict 0
+        #Total count of each common word, in order of dict zero
+        words = list(filter(common.__contains__, self._documents[0]))
+        totals = list(map(documents[0].__getitem__, words))
+        for document in documents[1:]:
+            totals = list(map(add, totals, map(document.__getitem__, words)))
 
-            #Check if total count is in the specified min/max range
-            if wordcount >= self._mincount and wordcount <= self._maxcount:
-                results[word] = wordcount
+        #Only keep words with a total count in the specified min/max range
+        results = [(word, wordcount) for word, wordcount in zip(words, totals) if wordcount >= self._mincount and wordcount <= self._maxcount]
 
-        #Return sorted worddict
-        return dict(sorted(results.items(), key=lambda x:x[1]))
+        #Return list sorted by number of occurrences
+        results.sort(key=itemgetter(1))
+        return results
 
 
     def save_results(self) -> None:
@@ -193,51 +275,45 @@ class DocumentAnalyser:
         Find duplicate words then save results to a csv file
         """
         csvresults = list()
-        titles = list(['Word', 'Count'])
-        worddict = self.find_duplicates()
+        titles = b'Word,Count\r\n'
+        wordlist = self.find_duplicates()
 
-        if worddict is None:
+        if wordlist is None:
             print('No results to write to results.csv')
             return
 
-        csvresults = list(worddict.items())
+        #Words never need csv quoting, so write the bytes directly
+        csvresults = [b'%s,%d\r\n' % (key, value) for key, value in wordlist]
 
-        with open('results.csv', 'w') as fh:
-            csvout = csv.writer(fh)
-            csvout.writerow(titles)
-            csvout.writerows(csvresults)
+        with open('results.csv', 'wb') as fh:
+            fh.write(titles)
+            fh.writelines(csvresults)
 
-        fh.close()
 
-
-def load_file(filename: str) -> str:
+def load_file(filename: str or Path) -> mmap.mmap or bytes:
     """
-    Load contents of file and returns as a string
+    Memory map contents of file for reading
     Check file exists
-    Read all lines of file
+    Map the file read only
 
     Returns:
-        String of all lines in file
-        Blank string if file doesn't exist or error occured
+        Read only mmap of file, which should be closed after use
+        Blank bytes if file doesn't exist, is empty, or error occured
     """
     if not os.path.isfile(filename):                       #Check file exists
         print(f'Error: Unable to load {filename}, file is missing')
-        return ''
+        return b''
 
+    #Mapping stays valid after the file is closed
     try:
-        f = open(filename, 'r')                            #Attempt to open file for reading
-    except IOError as e:
-        print(f'Error: Unable to read to {filename}')
-        print(e)
-        return ''
-    except OSError as e:
+        with open(filename, 'rb') as f:                    #Attempt to open file for reading
+            filelines = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:                                     #Empty files can't be mapped
+        return b''
+    except OSError as e:                                   #IOError is an alias of OSError
         print(f'Error: Unable to read to {filename}')
         print(e)
-        return ''
-    else:
-        filelines = f.read()
-    finally:
-        f.close()
+        return b''
 
     return filelines
 
@@ -246,7 +322,7 @@ def main():
     mincount = 0
     maxcount = 0
     checkdocuments = list()
-    ignoredocuments = ''
+    ignoredocuments = b''
 
     #Process arguments
     parser = argparse.ArgumentParser(description = 'Document analyser')
@@ -256,10 +332,8 @@ def main():
     parser.add_argument('--mincount', type=int, help='Mimimum word count')
     args = parser.parse_args()
 
-    #Load all text files to check for duplicates
-    for filename in args.files:
-        filelines = load_file(filename)
-        checkdocuments.append(filelines)
+    #Text files to check for duplicates, these are loaded when counting
+    checkdocuments = [Path(filename) for filename in args.files]
 
     #Any text documents to check for ignore words?
     if args.ignore is not None:
@@ -270,6 +344,11 @@ def main():
     maxcount = args.maxcount or 256
 
     docanalyser = DocumentAnalyser(checkdocuments, ignoredocuments=ignoredocuments, maxcount=maxcount, mincount=mincount)
+
+    #Words have been counted, so the memory mapped ignore file is no longer needed
+    if isinstance(ignoredocuments, mmap.mmap):
+        ignoredocuments.close()
+
     docanalyser.display_results()
     docanalyser.save_results()
 